@@ -3,11 +3,10 @@
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from jedXIP_logic import XipManager
+from jedXIP_logic import XipManager, EntryTable
 import os
 import threading
 import time
-from datetime import datetime
 import json
 import sys
 import subprocess
@@ -50,8 +49,8 @@ class XipApp(TkinterDnD.Tk):
         except tk.TclError as e:
             print(f"Could not load an icon: {e}. Icons will not be displayed.")
             self.folder_icon=self.file_icon=self.new_icon=self.save_icon=self.open_icon=self.extract_icon=self.extract_selected_icon=self.help_icon=self.developer_icon = None
-        self.logic = XipManager()
-        self.source_type = None; self.source_path = None; self.view_contents = []
+        self.logic = XipManager(hash_cache_path='hash_cache.json')
+        self.source_type = None; self.source_path = None; self.view_contents = EntryTable()
         self.staged_paths = []; self.current_nav_path = ""; self.item_path_map = {}
         self.file_types = [("XIP Archive", "*.xip"), ("XAR Archive", "*.xar"), ("All files", "*.*")]
         self.task_in_progress = False; self.temp_dir = tempfile.mkdtemp(prefix="jedxip_preview_"); self.last_hovered_item = None
@@ -99,6 +98,10 @@ class XipApp(TkinterDnD.Tk):
         extract_btn.pack(side=tk.LEFT, padx=2); Tooltip(extract_btn, "Extract All")
         extract_sel_btn = ttk.Button(toolbar_frame, image=self.extract_selected_icon, command=self.extract_selected, style='Toolbar.TButton')
         extract_sel_btn.pack(side=tk.LEFT, padx=2); Tooltip(extract_sel_btn, "Extract Selected")
+        analyze_btn = ttk.Button(toolbar_frame, text="Analyze", command=self.analyze_archive, style='Toolbar.TButton')
+        analyze_btn.pack(side=tk.LEFT, padx=2); Tooltip(analyze_btn, "Archive Size Report")
+        manifest_btn = ttk.Button(toolbar_frame, text="Manifest", command=self.create_manifest, style='Toolbar.TButton')
+        manifest_btn.pack(side=tk.LEFT, padx=2); Tooltip(manifest_btn, "SHA-256 Manifest")
         dev_btn = ttk.Button(toolbar_frame, image=self.developer_icon, command=self._show_developers_window, style='Toolbar.TButton')
         dev_btn.pack(side=tk.RIGHT, padx=2); Tooltip(dev_btn, "Developers")
         about_btn = ttk.Button(toolbar_frame, image=self.help_icon, command=self._show_about_window, style='Toolbar.TButton')
@@ -219,7 +222,7 @@ class XipApp(TkinterDnD.Tk):
         if not files_to_extract: return
         self.current_action = f"Extracting to {os.path.basename(target_path)}..."
         def task(q, *args):
-            success = self.logic.extract_selected(*args, progress_queue=q)
+            success = self.logic.extract_selected(*args, progress_queue=q, table=self.view_contents)
             self.after(0, self._task_finalizer, success, f"Successfully extracted to {target_path}", "Failed to extract selection.")
         self._run_task(task, self.source_path, files_to_extract, target_path)
 
@@ -233,7 +236,7 @@ class XipApp(TkinterDnD.Tk):
         if not new_archive_path: return
         self.current_action = "Compressing selection..."
         def task(q, *args):
-            success = self.logic.create_archive_from_members(*args, progress_queue=q)
+            success = self.logic.create_archive_from_members(*args, progress_queue=q, table=self.view_contents)
             self.after(0, self._task_finalizer, success, "New archive created from selection!", "Failed to create archive.")
         self._run_task(task, self.source_path, member_list, new_archive_path)
 
@@ -272,25 +275,12 @@ class XipApp(TkinterDnD.Tk):
         self.tree.delete(*self.tree.get_children()); self.item_path_map.clear(); self.last_hovered_item = None
         if self.current_nav_path:
             iid = self.tree.insert("", tk.END, text="..", values=("UP", "")); self.item_path_map[iid] = ".."
-        direct_children = {}
-        for item in self.view_contents:
-            path = item['filename']
-            if path.startswith(self.current_nav_path):
-                relative_path = path[len(self.current_nav_path):]
-                if not relative_path or relative_path == '/': continue
-                child_name = relative_path.split('/')[0]
-                if child_name not in direct_children:
-                    is_folder = (len(relative_path.split('/')) > 1 and relative_path.split('/')[1] != '') or path.endswith('/')
-                    full_child_path = self.current_nav_path + child_name + ("/" if is_folder else "")
-                    direct_children[child_name] = {'filename': full_child_path, 'is_folder': is_folder}
-        for name, data in sorted(direct_children.items()):
-            is_folder = data['is_folder']
+        for name, full_path, is_folder, index in self.view_contents.children(self.current_nav_path):
             icon = self.folder_icon if is_folder else self.file_icon
-            original_item = next((i for i in self.view_contents if i['filename'] == data['filename']), {})
-            formatted_size = self._format_bytes(original_item.get('size', 0))
-            modified_time = original_item.get('modified', '')
+            formatted_size = self._format_bytes(self.view_contents.sizes[index]) if index >= 0 else ""
+            modified_time = self.view_contents.modified(index) if index >= 0 else ""
             iid = self.tree.insert("", tk.END, text=name, image=icon, values=(formatted_size, modified_time))
-            self.item_path_map[iid] = data['filename']
+            self.item_path_map[iid] = full_path
             
     def _copy_item_path(self):
         selected_id = self.tree.selection()
@@ -357,16 +347,7 @@ class XipApp(TkinterDnD.Tk):
     def _handle_drag_drop(self, event):
         if self.task_in_progress: return
         self.source_type = 'staged'; self.source_path = None; self.staged_paths = self.tk.splitlist(event.data)
-        temp_contents = []
-        for path in self.staged_paths:
-            if os.path.isfile(path): temp_contents.append({'filename': os.path.basename(path), 'size': os.path.getsize(path), 'modified': datetime.fromtimestamp(os.path.getmtime(path)).strftime('%Y-%m-%d %H:%M:%S')})
-            elif os.path.isdir(path):
-                for root, _, files in os.walk(path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        relative_path = os.path.relpath(file_path, os.path.dirname(path))
-                        temp_contents.append({'filename': relative_path.replace('\\', '/'), 'size': os.path.getsize(file_path), 'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).strftime('%Y-%m-%d %H:%M:%S')})
-        self.view_contents = temp_contents
+        self.view_contents = self.logic.list_paths(self.staged_paths)
         self.title("jedXIP - New Archive"); self._navigate_to(""); self._update_new_save_button_state()
 
     def _run_task(self, task_func, *args):
@@ -436,13 +417,72 @@ class XipApp(TkinterDnD.Tk):
         if not dest_path: return
         self.current_action = "Extracting Selection..."
         def task(q, *args):
-            success = self.logic.extract_selected(*args, progress_queue=q)
+            success = self.logic.extract_selected(*args, progress_queue=q, table=self.view_contents)
             self.after(0, self._task_finalizer, success, "Selected items extracted successfully!", "Failed to extract selection.")
         self._run_task(task, self.source_path, files_to_extract, dest_path)
 
+    def analyze_archive(self):
+        if self.task_in_progress or self.source_type != 'archive': return
+        self.current_action = "Analyzing Archive..."
+        def task(q, *args):
+            report = self.logic.analyze_archive(*args, progress_queue=q, table=self.view_contents)
+            if report is not None: self.after(0, self._show_report_window, report)
+            self.after(0, self._task_finalizer, report is not None, "", "Failed to analyze archive.")
+        self._run_task(task, self.source_path)
+
+    def create_manifest(self):
+        if self.task_in_progress or self.source_type not in ('archive', 'staged'): return
+        manifest_path = filedialog.asksaveasfilename(title="Save Manifest As", filetypes=[("JSON", "*.json"), ("CSV", "*.csv")], defaultextension=".json")
+        if not manifest_path: return
+        self.current_action = "Hashing Contents..."
+        if self.source_type == 'staged':
+            def task(q, *args):
+                success = self.logic.staged_manifest(*args, progress_queue=q)
+                self.after(0, self._task_finalizer, success, "Manifest created successfully!", "Failed to create manifest.")
+            return self._run_task(task, self.staged_paths, manifest_path)
+        embed = messagebox.askyesno("Embed Manifest", "Also store the manifest inside the archive?")
+        def task(q, *args):
+            success = self.logic.archive_manifest(*args, embed=embed, progress_queue=q)
+            def finish():
+                self._task_finalizer(success, "Manifest created successfully!", "Failed to create manifest.")
+                # Reopen once the task is cleared so the embedded manifest shows up.
+                if success and embed: self.open_archive(args[0])
+            self.after(0, finish)
+        self._run_task(task, self.source_path, manifest_path)
+
+    def _show_report_window(self, report):
+        report_win = tk.Toplevel(self)
+        report_win.title(f"Report - {os.path.basename(report['archive'])}")
+        report_win.geometry("700x500"); report_win.transient(self)
+        fmt = lambda size: self._format_bytes(size) or "0 B"
+        lines = [f"{report['files']} files, {fmt(report['total_size'])} -> {fmt(report['total_compressed'])} (ratio {report['ratio']:.2f})", ""]
+        for title, key in (("Folders", 'folder'), ("Extensions", 'extension'), ("Methods", 'method')):
+            lines.append(f"== {title} ==")
+            for row in report[key + 's'][:20]:
+                lines.append(f"{row[key]:<40} {row['files']:>8}  {fmt(row['size']):>10}  ratio {row['ratio']:.2f}")
+            lines.append("")
+        lines.append("== Size Distribution ==")
+        for row in report['histogram']:
+            lines.append(f"{fmt(row['min']):>10} - {fmt(row['max']):<10} {row['files']:>8} files  {fmt(row['size']):>10}")
+        lines += ["", "== Largest Files =="]
+        for row in report['largest']:
+            lines.append(f"{fmt(row['size']):>10}  {row['method']:<9} {row['filename']}")
+        lines += ["", "== Duplicate Candidates =="]
+        for row in report['duplicates']:
+            lines.append(f"{row['count']} x {fmt(row['size'])} (wasted {fmt(row['wasted'])}): {', '.join(row['filenames'])}")
+        text = tk.Text(report_win, wrap=tk.NONE, background=self.colors["bg_light"], foreground=self.colors["text"], font=('Courier', 9))
+        text.insert(tk.END, "\n".join(lines)); text.configure(state=tk.DISABLED)
+        def export():
+            path = filedialog.asksaveasfilename(parent=report_win, title="Export Report", filetypes=[("CSV", "*.csv"), ("JSON", "*.json")], defaultextension=".csv")
+            if not path: return
+            if self.logic.export_report(report, path): self._set_status_message(f"Report exported to {path}")
+            else: messagebox.showerror("Error", "Failed to export report.", parent=report_win)
+        ttk.Button(report_win, text="Export...", command=export).pack(side=tk.BOTTOM, pady=5)
+        text.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
     def _preview_file(self, item_path):
         self._set_status_message(f"Opening: {os.path.basename(item_path)}...")
-        success = self.logic.extract_selected(self.source_path, [item_path], self.temp_dir)
+        success = self.logic.extract_selected(self.source_path, [item_path], self.temp_dir, table=self.view_contents)
         if success:
             temp_file_path = os.path.join(self.temp_dir, item_path)
             try:
@@ -2,50 +2,556 @@
 # Handles the logic for creating, reading, and extracting .xip/.xap archives.
 
 import os
+import sys
+import csv
+import json
+import mmap
+import heapq
+import struct
+import zlib
+import shutil
+import hashlib
 import zipfile
+from array import array
+from collections import Counter
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+MANIFEST_NAME = 'jedXIP-manifest.json'
+ZIP64_EXTRA_ID = 0x0001
+HASH_CHUNK_SIZE = 1024 * 1024
+
+COMPRESSION_NAMES = {
+    zipfile.ZIP_STORED: 'stored',
+    zipfile.ZIP_DEFLATED: 'deflated',
+    zipfile.ZIP_BZIP2: 'bzip2',
+    zipfile.ZIP_LZMA: 'lzma',
+}
+
+def _pack_dostime(date_time):
+    """Packs a (Y, M, D, h, m, s) tuple into a 32-bit MS-DOS timestamp, as stored in zip headers."""
+    year, month, day, hour, minute, second = date_time[:6]
+    if year < 1980: year, month, day, hour, minute, second = 1980, 1, 1, 0, 0, 0
+    elif year > 2107: year, month, day, hour, minute, second = 2107, 12, 31, 23, 59, 58
+    return (year - 1980) << 25 | month << 21 | day << 16 | hour << 11 | minute << 5 | second // 2
+
+class EntryTable:
+    """Compact, column-oriented listing of archive (or staged) entries.
+
+    Each entry is split into an interned directory and an interned base name;
+    sizes, offsets and timestamps live in typed arrays. Archive dates are kept as
+    packed DOS timestamps, staged files keep their exact mtime, and both are only
+    formatted when a row is displayed.
+    """
+    __slots__ = ('_dirs', '_dir_ids', '_dir_entries', 'dir_ids', 'names', 'sizes', 'compressed', 'offsets',
+                 'methods', 'crcs', 'dostimes', 'mtimes')
+
+    def __init__(self):
+        self._dirs = []
+        self._dir_ids = {}
+        # _dir_entries[dir_id] holds the indices of the entries directly in that directory.
+        self._dir_entries = []
+        self.dir_ids = array('L')
+        self.names = []
+        self.sizes = array('q')
+        self.compressed = array('q')
+        self.offsets = array('q')
+        self.methods = array('H')
+        self.crcs = array('L')
+        self.dostimes = array('L')
+        self.mtimes = array('d')
+
+    @classmethod
+    def from_zip(cls, zf):
+        table = cls()
+        for info in zf.infolist():
+            table.append(info.filename, info.file_size, info.compress_size, info.header_offset,
+                         info.compress_type, info.CRC, _pack_dostime(info.date_time))
+        return table
+
+    @classmethod
+    def from_paths(cls, source_paths):
+        """Builds a table for local files/folders, named as create_archive would store them."""
+        table = cls()
+        def add(file_path, arcname):
+            st = os.stat(file_path)
+            table.append(arcname.replace('\\', '/'), st.st_size, st.st_size, 0, zipfile.ZIP_STORED, 0, 0,
+                         mtime=st.st_mtime)
+        for path in source_paths:
+            if os.path.isfile(path):
+                add(path, os.path.basename(path))
+            elif os.path.isdir(path):
+                base_dir = os.path.dirname(path)
+                for root, _, files in os.walk(path):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        add(file_path, os.path.relpath(file_path, base_dir))
+        return table
+
+    def append(self, filename, size, compressed, offset, method, crc, dostime, mtime=None):
+        is_dir = filename.endswith('/')
+        head, _, name = (filename[:-1] if is_dir else filename).rpartition('/')
+        directory = head + '/' if head else ''
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self._dirs)
+            self._dirs.append(sys.intern(directory))
+            self._dir_entries.append(array('L'))
+        self._dir_entries[dir_id].append(len(self.names))
+        self.dir_ids.append(dir_id)
+        self.names.append(sys.intern(name + '/' if is_dir else name))
+        self.sizes.append(size)
+        self.compressed.append(compressed)
+        self.offsets.append(offset)
+        self.methods.append(method)
+        self.crcs.append(crc)
+        self.dostimes.append(dostime)
+        if mtime is not None:
+            self.mtimes.append(mtime)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        dirs = self._dirs
+        return (dirs[d] + name for d, name in zip(self.dir_ids, self.names))
+
+    def filename(self, i):
+        return self._dirs[self.dir_ids[i]] + self.names[i]
+
+    def modified(self, i):
+        if self.mtimes:
+            return datetime.fromtimestamp(self.mtimes[i]).strftime('%Y-%m-%d %H:%M:%S')
+        t = self.dostimes[i]
+        return (f"{(t >> 25) + 1980:04d}-{(t >> 21) & 0xF:02d}-{(t >> 16) & 0x1F:02d} "
+                f"{(t >> 11) & 0x1F:02d}:{(t >> 5) & 0x3F:02d}:{(t & 0x1F) * 2:02d}")
+
+    def children(self, prefix):
+        """Returns sorted (name, full_path, is_folder, index) rows directly under a folder prefix.
+
+        index is the matching entry, or -1 for folders that only exist implicitly.
+        """
+        children = {}
+        for directory in self._dir_ids:
+            if directory != prefix and directory.startswith(prefix):
+                child = directory[len(prefix):].split('/')[0]
+                children[child] = [child, prefix + child + '/', True, -1]
+        target = self._dir_ids.get(prefix)
+        if target is not None:
+            for i in self._dir_entries[target]:
+                name = self.names[i]
+                if name.endswith('/'):
+                    child = name[:-1]
+                    if child:
+                        children.setdefault(child, [child, prefix + name, True, -1])[3] = i
+                else:
+                    children[name] = [name, prefix + name, False, i]
+        return [tuple(row) for _, row in sorted(children.items())]
+
+    def expand(self, member_list):
+        """Resolves a selection of files and folders ('name/') into the entry names it covers."""
+        folders = tuple(m for m in member_list if m.endswith('/'))
+        selected = {m for m in member_list if not m.endswith('/')}
+        if folders:
+            for directory, dir_id in self._dir_ids.items():
+                if directory.startswith(folders):
+                    selected.update(directory + self.names[i] for i in self._dir_entries[dir_id])
+            # A folder's own 'name/' entry is listed under its parent directory.
+            for folder in folders:
+                head, _, name = folder[:-1].rpartition('/')
+                dir_id = self._dir_ids.get(head + '/' if head else '')
+                if dir_id is not None and any(self.names[i] == name + '/' for i in self._dir_entries[dir_id]):
+                    selected.add(folder)
+        return selected
+
+    def folder_totals(self):
+        """Returns {folder: [files, size, compressed]}, counting each file in every ancestor folder.
+
+        The archive root is reported as '/'.
+        """
+        totals = {}
+        for directory, dir_id in self._dir_ids.items():
+            files = [i for i in self._dir_entries[dir_id] if not self.names[i].endswith('/')]
+            if not files:
+                continue
+            count = len(files)
+            size = sum(self.sizes[i] for i in files)
+            compressed = sum(self.compressed[i] for i in files)
+            folder = directory
+            while True:
+                entry = totals.setdefault(folder or '/', [0, 0, 0])
+                entry[0] += count
+                entry[1] += size
+                entry[2] += compressed
+                if not folder:
+                    break
+                head = folder[:-1].rpartition('/')[0]
+                folder = head + '/' if head else ''
+        return totals
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    return os.copy_file_range(src_fd, dst_fd, count, offset)
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+# Kernel-side copies to try in order; sendfile only handles file-to-file copies on Linux.
+_KERNEL_COPIES = []
+if hasattr(os, 'copy_file_range'):
+    _KERNEL_COPIES.append(_copy_file_range)
+if hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+    _KERNEL_COPIES.append(_sendfile)
+
+def _copy_range(src_fd, dst_fd, offset, count, view):
+    """Appends count bytes at offset of src_fd to dst_fd, kernel-side when the OS allows it.
+
+    view is the same byte range as a memoryview; it is written directly when no
+    kernel copy is available or every one of them is refused (EXDEV, EINVAL, ENOSYS).
+    """
+    copied = 0
+    for kernel_copy in _KERNEL_COPIES:
+        try:
+            while copied < count:
+                n = kernel_copy(src_fd, dst_fd, offset + copied, count - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError:
+            continue
+        if copied == count:
+            return
+    while copied < count:
+        copied += os.write(dst_fd, view[copied:count])
+
+def _write_all(fd, data):
+    written = 0
+    while written < len(data):
+        written += os.write(fd, data[written:])
+
+def _member_target(destination_path, filename):
+    """Maps a member name to a path under destination_path, sanitized the way ZipFile.extract does."""
+    arcname = filename.replace('/', os.path.sep)
+    if os.path.altsep: arcname = arcname.replace(os.path.altsep, os.path.sep)
+    arcname = os.path.splitdrive(arcname)[1]
+    parts = [x for x in arcname.split(os.path.sep) if x not in ('', os.path.curdir, os.path.pardir)]
+    if os.path.sep == '\\':
+        table = str.maketrans(':<>|"?*', '_______')
+        parts = [x for x in (part.translate(table).rstrip('.') for part in parts) if x]
+    return os.path.normpath(os.path.join(destination_path, *parts))
+
+def _dos_date_time(date_time):
+    packed = _pack_dostime(date_time)
+    return packed & 0xFFFF, packed >> 16
+
+def _strip_zip64(extra):
+    """Drops the ZIP64 field from an extra block, keeping every other field as-is."""
+    kept = []
+    i = 0
+    while i + 4 <= len(extra):
+        field_id, size = struct.unpack_from('<HH', extra, i)
+        if field_id != ZIP64_EXTRA_ID:
+            kept.append(bytes(extra[i:i + 4 + size]))
+        i += 4 + size
+    kept.append(bytes(extra[i:]))
+    return b''.join(kept)
+
+class MappedArchive:
+    """Memory-mapped, read-only access to the members of an archive.
+
+    Stored members and raw compressed ranges are handed out as memoryview
+    slices of the mapping; extraction and raw copies move them with kernel
+    copies where available. Slices must be released before close().
+    """
+
+    def __init__(self, archive_path):
+        self.zf = zipfile.ZipFile(archive_path, 'r')
+        try:
+            self._file = open(archive_path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.zf.close()
+            raise
+        self._view = memoryview(self._mm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._view.release()
+        self._mm.close()
+        self._file.close()
+        self.zf.close()
+
+    def _local_header(self, info):
+        header = struct.unpack_from(zipfile.structFileHeader, self._mm, info.header_offset)
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+        return header
+
+    def data_offset(self, info):
+        """Returns the offset of a member's compressed data, just past its local header."""
+        header = self._local_header(info)
+        return info.header_offset + zipfile.sizeFileHeader + header[-2] + header[-1]
+
+    def local_extra(self, info):
+        """Returns the extra field of a member's local header, which may differ from info.extra."""
+        header = self._local_header(info)
+        start = info.header_offset + zipfile.sizeFileHeader + header[-2]
+        return self._mm[start:start + header[-1]]
+
+    def raw_view(self, info):
+        """Returns the member's compressed bytes as a memoryview into the mapping."""
+        offset = self.data_offset(info)
+        return self._view[offset:offset + info.compress_size]
+
+    def stored_view(self, info):
+        """Returns the contents of an uncompressed, unencrypted member without copying."""
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            raise ValueError(f"{info.filename} is not a plain stored member")
+        return self.raw_view(info)
+
+    def verify(self, info):
+        """Raises BadZipFile unless the member's data matches its CRC-32.
+
+        Stored members are checked straight from the mapping; others are
+        decompressed and discarded, letting ZipFile do the check.
+        """
+        if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+            with self.stored_view(info) as view:
+                if zlib.crc32(view) != info.CRC:
+                    raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+        else:
+            with self.zf.open(info) as f:
+                while f.read(1024 * 1024):
+                    pass
+
+    def extract(self, member, destination_path):
+        """Extracts one member like ZipFile.extract, kernel-copying stored payloads."""
+        info = member if isinstance(member, zipfile.ZipInfo) else self.zf.getinfo(member)
+        if info.is_dir() or info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return self.zf.extract(info, destination_path)
+        self.verify(info)
+        target = _member_target(destination_path, info.filename)
+        with self.stored_view(info) as view:
+            parent = os.path.dirname(target)
+            if parent:
+                os.makedirs(parent, exist_ok=True)
+            with open(target, 'wb', buffering=0) as out:
+                _copy_range(self._file.fileno(), out.fileno(), self.data_offset(info), info.file_size, view)
+        return target
+
+    def copy_raw(self, infos, new_archive_path, progress_queue=None, verify=False, comment=b''):
+        """Writes the members to a new archive as-is, without decompressing or recompressing them.
+
+        Extra fields are carried over and ZIP64 records are written when sizes,
+        offsets or the member count need them. Encrypted members are copied
+        untouched, with their data descriptor rewritten. Unencrypted stored
+        members are always CRC-checked first; compressed ones only with
+        verify=True, since that means decompressing each of them.
+        """
+        limit = zipfile.ZIP64_LIMIT
+        central = []
+        with open(new_archive_path, 'wb', buffering=0) as out:
+            fd = out.fileno()
+            offset = 0
+            for info in infos:
+                if not info.flag_bits & 0x1 and (verify or info.compress_type == zipfile.ZIP_STORED):
+                    self.verify(info)
+                try:
+                    name = info.filename.encode('ascii')
+                    flags = info.flag_bits & ~0x800
+                except UnicodeEncodeError:
+                    name = info.filename.encode('utf-8')
+                    flags = info.flag_bits | 0x800
+                dostime, dosdate = _dos_date_time(info.date_time)
+                zip64 = info.file_size >= limit or info.compress_size >= limit
+                extract_version = max(info.extract_version, 45) if zip64 else info.extract_version
+
+                # Local header. With a data descriptor (bit 3) the CRC and sizes follow the data,
+                # which keeps the encryption check byte of traditionally encrypted members valid.
+                crc, compress_size, file_size = info.CRC, info.compress_size, info.file_size
+                if flags & 0x08:
+                    crc = compress_size = file_size = 0
+                local_extra = _strip_zip64(self.local_extra(info))
+                if zip64:
+                    local_extra = struct.pack('<HHQQ', ZIP64_EXTRA_ID, 16, file_size, compress_size) + local_extra
+                    compress_size = file_size = 0xFFFFFFFF
+                header = struct.pack(zipfile.structFileHeader, zipfile.stringFileHeader, extract_version, info.reserved,
+                                     flags, info.compress_type, dostime, dosdate, crc, compress_size, file_size,
+                                     len(name), len(local_extra))
+                _write_all(fd, header + name + local_extra)
+                with self.raw_view(info) as view:
+                    _copy_range(self._file.fileno(), fd, self.data_offset(info), info.compress_size, view)
+                descriptor = b''
+                if flags & 0x08:
+                    descriptor = struct.pack('<4sLQQ' if zip64 else '<4sLLL', b'PK\x07\x08', info.CRC,
+                                             info.compress_size, info.file_size)
+                    _write_all(fd, descriptor)
+
+                # Central directory record; each value too large for its field moves to the ZIP64 extra.
+                fields = [info.file_size, info.compress_size, offset]
+                zip64_values = [value for value in fields if value >= limit]
+                central_extra = _strip_zip64(info.extra)
+                if zip64_values:
+                    central_extra = struct.pack(f'<HH{len(zip64_values)}Q', ZIP64_EXTRA_ID, 8 * len(zip64_values),
+                                                *zip64_values) + central_extra
+                    fields = [0xFFFFFFFF if value >= limit else value for value in fields]
+                    extract_version = max(extract_version, 45)
+                central.append(struct.pack(zipfile.structCentralDir, zipfile.stringCentralDir, info.create_version,
+                                           info.create_system, extract_version, info.reserved, flags,
+                                           info.compress_type, dostime, dosdate, info.CRC, fields[1], fields[0],
+                                           len(name), len(central_extra), len(info.comment), 0, info.internal_attr,
+                                           info.external_attr, fields[2]) + name + central_extra + info.comment)
+                offset += len(header) + len(name) + len(local_extra) + info.compress_size + len(descriptor)
+                if progress_queue:
+                    progress_queue.put('increment')
+
+            directory = b''.join(central)
+            count = len(central)
+            end = b''
+            if count >= 0xFFFF or len(directory) >= limit or offset >= limit:
+                end += struct.pack(zipfile.structEndArchive64, zipfile.stringEndArchive64, zipfile.sizeEndCentDir64 - 12,
+                                   45, 45, 0, 0, count, count, len(directory), offset)
+                end += struct.pack(zipfile.structEndArchive64Locator, zipfile.stringEndArchive64Locator, 0,
+                                   offset + len(directory), 1)
+            end += struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0, min(count, 0xFFFF),
+                               min(count, 0xFFFF), min(len(directory), 0xFFFFFFFF), min(offset, 0xFFFFFFFF),
+                               len(comment))
+            _write_all(fd, directory + end + comment)
+
+def _hash_member(archive, info):
+    """SHA-256 of a member's contents, raising BadZipFile if they don't match its CRC-32.
+
+    Stored members are hashed straight from the mapping.
+    """
+    sha = hashlib.sha256()
+    crc = 0
+    if info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x1:
+        with archive.stored_view(info) as view:
+            sha.update(view)
+            crc = zlib.crc32(view)
+    else:
+        with archive.zf.open(info) as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                sha.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+    if crc != info.CRC:
+        raise zipfile.BadZipFile(f"Bad CRC-32 for file {info.filename!r}")
+    return sha.hexdigest()
+
+def _hash_file(path):
+    """Returns (size, crc32, sha256) of a local file in a single read pass."""
+    sha = hashlib.sha256()
+    crc = 0
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+    return size, crc, sha.hexdigest()
+
+def _ratio(compressed, size):
+    return round(compressed / size, 4) if size else 1.0
+
+def _group_totals(keys, sizes, compressed):
+    """Aggregates file count, size and compressed size per key."""
+    totals = {}
+    for key, size, csize in zip(keys, sizes, compressed):
+        entry = totals.get(key)
+        if entry is None:
+            totals[key] = [1, size, csize]
+        else:
+            entry[0] += 1
+            entry[1] += size
+            entry[2] += csize
+    return totals
+
+def _total_rows(totals, label):
+    """Turns {key: [files, size, compressed]} into report rows, largest first."""
+    rows = [{label: key, 'files': files, 'size': size, 'compressed': csize, 'ratio': _ratio(csize, size)}
+            for key, (files, size, csize) in totals.items()]
+    rows.sort(key=lambda row: row['size'], reverse=True)
+    return rows
 
 class XipManager:
     """Manages all archive operations like create, list, and extract."""
 
+    def __init__(self, hash_cache_path=None):
+        # Verified SHA-256 digests, optionally persisted between runs. 'archives' maps an
+        # archive's absolute path to {member: [crc, size, header_offset, sha256]};
+        # 'files' maps a staged file's absolute path to [mtime_ns, size, sha256, crc].
+        self.hash_cache_path = hash_cache_path
+        self._hash_cache = None
+        self._hash_cache_dirty = False
+
+    def _load_hash_cache(self):
+        if self._hash_cache is None:
+            cache = {}
+            if self.hash_cache_path:
+                try:
+                    with open(self.hash_cache_path, 'r') as f:
+                        cache = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    pass
+            if not isinstance(cache, dict) or cache.get('version') != 1:
+                cache = {'version': 1, 'archives': {}, 'files': {}}
+            self._hash_cache = cache
+        return self._hash_cache
+
+    def _save_hash_cache(self):
+        """Persists the hash cache if it changed; a failed save is logged, not raised."""
+        if not self.hash_cache_path or not self._hash_cache_dirty:
+            return
+        try:
+            with open(self.hash_cache_path, 'w') as f:
+                json.dump(self._hash_cache, f)
+            self._hash_cache_dirty = False
+        except OSError as e:
+            print(f"Could not save hash cache: {e}")
+
     def list_contents(self, archive_path):
-        """Lists the contents of a .xip or .xap archive."""
+        """Lists the contents of a .xip or .xap archive as an EntryTable."""
         try:
             with zipfile.ZipFile(archive_path, 'r') as zf:
-                content_list = []
-                for info in zf.infolist():
-                    content_list.append({
-                        'filename': info.filename,
-                        'size': info.file_size,
-                        'modified': datetime(*info.date_time).strftime('%Y-%m-%d %H:%M:%S')
-                    })
-                return content_list
+                return EntryTable.from_zip(zf)
         except (zipfile.BadZipFile, FileNotFoundError):
             return None
 
+    def list_paths(self, source_paths):
+        """Lists local files/folders staged for a new archive as an EntryTable."""
+        return EntryTable.from_paths(source_paths)
+
     def extract_archive(self, archive_path, destination_path, progress_queue=None):
         """Extracts all contents of an archive, reporting progress."""
         try:
-            with zipfile.ZipFile(archive_path, 'r') as zf:
-                members = zf.infolist()
+            with MappedArchive(archive_path) as archive:
+                members = archive.zf.infolist()
                 if progress_queue:
                     progress_queue.put({'total': len(members)})
                 for member in members:
-                    zf.extract(member, destination_path)
+                    archive.extract(member, destination_path)
                     if progress_queue:
                         progress_queue.put('increment')
             return True
         except (zipfile.BadZipFile, FileNotFoundError):
             return False
             
-    def extract_selected(self, archive_path, member_list, destination_path, progress_queue=None):
-        """Extracts a specific list of members, reporting progress."""
+    def extract_selected(self, archive_path, member_list, destination_path, progress_queue=None, table=None):
+        """Extracts a specific list of members, reporting progress.
+
+        table is the archive's EntryTable, if the caller already has one loaded.
+        """
         try:
-            with zipfile.ZipFile(archive_path, 'r') as zf:
+            with MappedArchive(archive_path) as archive:
+                members = sorted((table or EntryTable.from_zip(archive.zf)).expand(member_list))
                 if progress_queue:
-                    progress_queue.put({'total': len(member_list)})
-                for member in member_list:
-                    zf.extract(member, destination_path)
+                    progress_queue.put({'total': len(members)})
+                for member in members:
+                    archive.extract(member, destination_path)
                     if progress_queue:
                         progress_queue.put('increment')
             return True
@@ -84,30 +590,271 @@ class XipManager:
             print(f"Error creating archive: {e}")
             return False
 
-    def create_archive_from_members(self, source_archive_path, member_list, new_archive_path, progress_queue=None):
-        """Creates a new archive from selected files within an existing archive."""
+    def create_archive_from_members(self, source_archive_path, member_list, new_archive_path, progress_queue=None, table=None, verify=False):
+        """Creates a new archive from selected files within an existing archive.
+
+        Members are copied still compressed (see MappedArchive.copy_raw). Stored
+        members are CRC-checked before copying; compressed ones are copied
+        unchecked unless verify=True. table is the source archive's EntryTable,
+        if the caller already has one loaded.
+        """
         try:
-            with zipfile.ZipFile(source_archive_path, 'r') as source_zf:
-                full_member_list = set()
-                for member_path in member_list:
-                    if member_path.endswith('/'): # It's a folder
-                        for item in source_zf.infolist():
-                            if item.filename.startswith(member_path):
-                                full_member_list.add(item.filename)
-                    else:
-                        full_member_list.add(member_path)
+            with MappedArchive(source_archive_path) as archive:
+                full_member_list = (table or EntryTable.from_zip(archive.zf)).expand(member_list)
+                infos = [archive.zf.getinfo(name) for name in sorted(full_member_list) if not name.endswith('/')]
 
                 if progress_queue:
-                    progress_queue.put({'total': len(full_member_list)})
-
-                with zipfile.ZipFile(new_archive_path, 'w', zipfile.ZIP_DEFLATED) as dest_zf:
-                    for member_name in sorted(list(full_member_list)):
-                        if not member_name.endswith('/'):
-                            file_data = source_zf.read(member_name)
-                            dest_zf.writestr(member_name, file_data)
-                        if progress_queue:
-                            progress_queue.put('increment')
+                    progress_queue.put({'total': len(infos)})
+
+                archive.copy_raw(infos, new_archive_path, progress_queue, verify)
             return True
         except Exception as e:
             print(f"Error creating archive from members: {e}")
             return False
+
+    def analyze_archive(self, archive_path, top_n=20, progress_queue=None, table=None):
+        """Builds a size/compression report for an archive, or None if it can't be read.
+
+        table is the archive's EntryTable, if the caller already has one loaded.
+        """
+        table = table or self.list_contents(archive_path)
+        if table is None:
+            return None
+        if progress_queue:
+            progress_queue.put({'total': 5})
+
+        # Directory entries carry no data; every pass below works on files only.
+        file_idx = [i for i, name in enumerate(table.names) if not name.endswith('/')]
+        names = [table.filename(i) for i in file_idx]
+        sizes = array('q', [table.sizes[i] for i in file_idx])
+        compressed = array('q', [table.compressed[i] for i in file_idx])
+        methods = [COMPRESSION_NAMES.get(table.methods[i], 'other') for i in file_idx]
+        crcs = array('L', [table.crcs[i] for i in file_idx])
+        total_size = sum(sizes)
+        total_compressed = sum(compressed)
+
+        extensions = [os.path.splitext(name)[1].lower() or '(none)' for name in names]
+        report = {
+            'archive': archive_path,
+            'entries': len(table),
+            'files': len(names),
+            'total_size': total_size,
+            'total_compressed': total_compressed,
+            'ratio': _ratio(total_compressed, total_size),
+            'folders': _total_rows(table.folder_totals(), 'folder'),
+        }
+        if progress_queue: progress_queue.put('increment')
+        report['extensions'] = _total_rows(_group_totals(extensions, sizes, compressed), 'extension')
+        report['methods'] = _total_rows(_group_totals(methods, sizes, compressed), 'method')
+        if progress_queue: progress_queue.put('increment')
+
+        # Power-of-two buckets: a file of n bytes falls into bucket n.bit_length().
+        bucket_files = Counter(map(int.bit_length, sizes))
+        bucket_sizes = Counter()
+        for size in sizes:
+            bucket_sizes[size.bit_length()] += size
+        report['histogram'] = [{'bucket': bucket, 'min': (1 << (bucket - 1)) if bucket else 0, 'max': (1 << bucket) - 1,
+                                'files': bucket_files[bucket], 'size': bucket_sizes[bucket]}
+                               for bucket in sorted(bucket_files)]
+        if progress_queue: progress_queue.put('increment')
+
+        largest = heapq.nlargest(top_n, range(len(names)), key=sizes.__getitem__)
+        report['largest'] = [{'filename': names[i], 'size': sizes[i], 'compressed': compressed[i],
+                              'ratio': _ratio(compressed[i], sizes[i]), 'method': methods[i]} for i in largest]
+        if progress_queue: progress_queue.put('increment')
+
+        # Same CRC and size is a strong hint (not proof) that two members hold identical data.
+        groups = {}
+        for i, (crc, size) in enumerate(zip(crcs, sizes)):
+            if size:
+                groups.setdefault((crc, size), []).append(i)
+        duplicates = [{'crc': f"{crc:08x}", 'size': size, 'count': len(idx), 'wasted': size * (len(idx) - 1),
+                       'filenames': [names[i] for i in idx]}
+                      for (crc, size), idx in groups.items() if len(idx) > 1]
+        duplicates.sort(key=lambda row: row['wasted'], reverse=True)
+        report['duplicates'] = duplicates[:top_n]
+        if progress_queue: progress_queue.put('increment')
+        return report
+
+    def export_report(self, report, output_path):
+        """Writes a report from analyze_archive to .json, or to .csv for any other extension."""
+        try:
+            if output_path.lower().endswith('.json'):
+                with open(output_path, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=2)
+                return True
+            with open(output_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['section', 'name', 'files', 'size', 'compressed', 'ratio', 'crc', 'wasted'])
+                writer.writerow(['total', report['archive'], report['files'], report['total_size'],
+                                 report['total_compressed'], report['ratio']])
+                for section, key in (('folder', 'folder'), ('extension', 'extension'), ('method', 'method')):
+                    for row in report[section + 's']:
+                        writer.writerow([section, row[key], row['files'], row['size'], row['compressed'], row['ratio']])
+                for row in report['histogram']:
+                    writer.writerow(['histogram', f"{row['min']}-{row['max']}", row['files'], row['size'], '', ''])
+                for row in report['largest']:
+                    writer.writerow(['largest', row['filename'], 1, row['size'], row['compressed'], row['ratio']])
+                for row in report['duplicates']:
+                    writer.writerow(['duplicate', '|'.join(row['filenames']), row['count'], row['size'], '', '', row['crc'], row['wasted']])
+            return True
+        except (OSError, KeyError) as e:
+            print(f"Error exporting report: {e}")
+            return False
+
+    def archive_manifest(self, archive_path, manifest_path=None, embed=False, workers=None, progress_queue=None):
+        """Hashes every member of an archive on a worker pool and writes a manifest.
+
+        Each member is checked against its CRC-32 while it is hashed; if any
+        fails, nothing is written. Digests are cached per archive and member, so
+        a member whose name, CRC, size and header offset are unchanged is not
+        read again. With embed=True the manifest is also stored in the archive
+        as MANIFEST_NAME, replacing an older one; the standalone manifest is
+        written first and kept even if embedding fails.
+        """
+        try:
+            cache = self._load_hash_cache()
+            archive_key = os.path.abspath(archive_path)
+            cached = cache['archives'].get(archive_key, {})
+            members = {}
+            digests = {}
+            pending = {}
+            failed = []
+            with MappedArchive(archive_path) as archive:
+                infos = [info for info in archive.zf.infolist() if not info.is_dir() and info.filename != MANIFEST_NAME]
+                if progress_queue:
+                    progress_queue.put({'total': len(infos)})
+                for info in infos:
+                    entry = cached.get(info.filename)
+                    if entry and entry[:3] == [info.CRC, info.file_size, info.header_offset]:
+                        digests[info.filename] = entry[3]
+                        members[info.filename] = entry
+                        if progress_queue: progress_queue.put('increment')
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    for info in infos:
+                        if info.filename not in digests:
+                            pending[pool.submit(_hash_member, archive, info)] = info
+                    for future in as_completed(pending):
+                        info = pending[future]
+                        try:
+                            digests[info.filename] = future.result()
+                        except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+                            failed.append(f"{info.filename}: {e}")
+                        else:
+                            members[info.filename] = [info.CRC, info.file_size, info.header_offset, digests[info.filename]]
+                        if progress_queue: progress_queue.put('increment')
+                entries = [{'path': info.filename, 'size': info.file_size, 'crc32': f"{info.CRC:08x}",
+                            'sha256': digests[info.filename]} for info in infos if info.filename in digests]
+                embedded = archive.zf.read(MANIFEST_NAME) if embed and MANIFEST_NAME in archive.zf.namelist() else None
+            if members != cached:
+                cache['archives'][archive_key] = members
+                self._hash_cache_dirty = True
+            if failed:
+                self._save_hash_cache()
+                print(f"Error creating manifest: {len(failed)} member(s) failed verification:\n  " + "\n  ".join(failed))
+                return False
+
+            manifest = {'source': os.path.basename(archive_path), 'files': entries}
+            if manifest_path:
+                self._write_manifest(manifest, manifest_path)
+            data = json.dumps(manifest, indent=2).encode('utf-8')
+            if embed and embedded != data:
+                try:
+                    self._embed_manifest(archive_path, data, replace=embedded is not None)
+                except Exception as e:
+                    self._save_hash_cache()
+                    print(f"Error embedding manifest in {archive_path}: {e}")
+                    return False
+                # Rewriting the archive may move members; their digests still hold at the new offsets.
+                with zipfile.ZipFile(archive_path, 'r') as zf:
+                    for info in zf.infolist():
+                        entry = members.get(info.filename)
+                        if entry and entry[:2] == [info.CRC, info.file_size] and entry[2] != info.header_offset:
+                            entry[2] = info.header_offset
+                            self._hash_cache_dirty = True
+            self._save_hash_cache()
+            return True
+        except Exception as e:
+            print(f"Error creating manifest: {e}")
+            return False
+
+    def _embed_manifest(self, archive_path, data, replace=False):
+        """Stores data as MANIFEST_NAME in the archive, first dropping an older copy if replace is set.
+
+        The archive is rewritten with MappedArchive.copy_raw, which keeps the
+        other members compressed along with their extra fields and the archive
+        comment.
+        """
+        if replace:
+            temp_path = archive_path + '.tmp'
+            try:
+                with MappedArchive(archive_path) as archive:
+                    infos = [info for info in archive.zf.infolist() if info.filename != MANIFEST_NAME]
+                    archive.copy_raw(infos, temp_path, comment=archive.zf.comment)
+                os.replace(temp_path, archive_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        with zipfile.ZipFile(archive_path, 'a', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(MANIFEST_NAME, data)
+
+    def staged_manifest(self, source_paths, manifest_path, workers=None, progress_queue=None):
+        """Hashes staged local files on a worker pool and writes a manifest.
+
+        Paths are named as create_archive would store them. Local files are read
+        once for both CRC-32 and SHA-256; digests are cached per path, mtime and
+        size.
+        """
+        try:
+            cached = self._load_hash_cache()['files']
+            files = []
+            for path in source_paths:
+                if os.path.isfile(path):
+                    files.append((path, os.path.basename(path)))
+                elif os.path.isdir(path):
+                    base_dir = os.path.dirname(path)
+                    for root, _, names in os.walk(path):
+                        for name in names:
+                            file_path = os.path.join(root, name)
+                            files.append((file_path, os.path.relpath(file_path, base_dir).replace('\\', '/')))
+            if progress_queue:
+                progress_queue.put({'total': len(files)})
+            results = {}
+            pending = {}
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for file_path, arcname in files:
+                    key = os.path.abspath(file_path)
+                    st = os.stat(file_path)
+                    entry = cached.get(key)
+                    if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                        results[arcname] = {'path': arcname, 'size': entry[1], 'crc32': f"{entry[3]:08x}", 'sha256': entry[2]}
+                        if progress_queue: progress_queue.put('increment')
+                    else:
+                        pending[pool.submit(_hash_file, file_path)] = (arcname, key, st)
+                for future in as_completed(pending):
+                    arcname, key, st = pending[future]
+                    size, crc, digest = future.result()
+                    results[arcname] = {'path': arcname, 'size': size, 'crc32': f"{crc:08x}", 'sha256': digest}
+                    # A file that changed while it was read is reported but not cached.
+                    if size == st.st_size and os.stat(key).st_mtime_ns == st.st_mtime_ns:
+                        cached[key] = [st.st_mtime_ns, size, digest, crc]
+                        self._hash_cache_dirty = True
+                    if progress_queue: progress_queue.put('increment')
+            self._save_hash_cache()
+            self._write_manifest({'source': 'staged', 'files': [results[arcname] for _, arcname in files]}, manifest_path)
+            return True
+        except Exception as e:
+            print(f"Error creating manifest: {e}")
+            return False
+
+    def _write_manifest(self, manifest, manifest_path):
+        """Writes a manifest as JSON, or as CSV rows of path, size and digests."""
+        if manifest_path.lower().endswith('.csv'):
+            with open(manifest_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['path', 'size', 'crc32', 'sha256'])
+                for entry in manifest['files']:
+                    writer.writerow([entry['path'], entry['size'], entry['crc32'], entry['sha256']])
+        else:
+            with open(manifest_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)